@@ -1,3 +1,5 @@
+import sys
+import time
 import cv2
 import numpy as np
 from pynput.mouse import Button, Controller
@@ -18,34 +20,103 @@ lowerBound=np.array(objColor[0][0])
 upperBound=np.array(objColor[0][1])
 
 cam= cv2.VideoCapture(0)
+if not cam.isOpened():
+    sys.exit("Could not open camera 0")
+#ask for MJPEG before setting the size: YUYV saturates USB at higher rates and
+#frames skipped with grab() are then never decoded
+cam.set(cv2.CAP_PROP_FOURCC,cv2.VideoWriter_fourcc(*'MJPG'))
+if int(cam.get(cv2.CAP_PROP_FOURCC)) != cv2.VideoWriter_fourcc(*'MJPG'):
+    print("Camera does not support MJPG, using its default format")
 cam.set(3,camx)
 cam.set(4,camy)
+#keep only the newest frame in the driver queue so we never process a stale one
+if not cam.set(cv2.CAP_PROP_BUFFERSIZE,1):
+    print("Camera does not support CAP_PROP_BUFFERSIZE, frames may lag")
 kernelOpen=np.ones((5,5))
 kernelClose=np.ones((20,20))
 
+#per-frame work buffers, (re)allocated only when the frame size changes
+imgHSV = None
+imgSmall = np.empty((camy,camx,3),np.uint8)
+
 mLocOld = np.array([0,0])
 mouseLoc = np.array([0,0])
 
 DampingFactor = 2.35#Value Should Be >1 
 #mouseLoc = mLocOld + (targetLoc - mLocOld)/DampingFactor
 pinchFlag = 0
+idleFrameSkip = 2#frames grabbed but not decoded while no object is in view
+idleSkip = 0
+idle = False
+Deadband = 1#pointer moves smaller than this (screen pixels) are not sent
+lastPos = None
+MotionPixelDelta = 25#change in any colour channel that marks a thumbnail value as changed
+MotionPixels = 4#changed thumbnail values that end a static idle scene
+MaxGatedFrames = 10#camera frames an idle scene may go without a full pass
+refSmall = None
+framesSinceFull = 0
 
 while True:
-    ret, img=cam.read()
-    #img=cv2.resize(img,(340,220))
+    #grab() only advances the stream; frames are decoded by retrieve() just when used
+    if not cam.grab():
+        if not cam.isOpened():
+            sys.exit("Camera was closed")
+        #back off instead of spinning while the camera has no frame
+        time.sleep(0.01)
+        continue
+    framesSinceFull += 1
+    #never skip the frame that is due a forced full pass
+    if idle and idleFrameSkip > 0 and framesSinceFull < MaxGatedFrames:
+        idleSkip = (idleSkip + 1) % (idleFrameSkip + 1)
+        if idleSkip != 0:
+            #nothing new to show, but keep the window responsive
+            cv2.waitKey(1)
+            continue
+    ret, img=cam.retrieve()
+    if not ret:
+        continue
+
+    #cameras that ignore the requested size still get processed at camx x camy,
+    #which also keeps the camera -> screen mapping correct
+    if img.shape[1] != camx or img.shape[0] != camy:
+        img=cv2.resize(img,(camx,camy),dst=imgSmall,interpolation=cv2.INTER_AREA)
+
+    #cheap motion gate: while nothing is in view, skip the HSV/morphology pipeline
+    #until enough values of a half-size colour copy differ from the last processed one;
+    #colour rather than grey, since a blue marker can barely change the brightness
+    if idle:
+        small = cv2.resize(img,(camx//2,camy//2),interpolation=cv2.INTER_AREA)
+        if (refSmall is not None and framesSinceFull < MaxGatedFrames
+                and np.count_nonzero(cv2.absdiff(small,refSmall) > MotionPixelDelta) < MotionPixels):
+            cv2.imshow("cam",img)
+            cv2.waitKey(1)
+            continue
+        refSmall = small
+    else:
+        refSmall = None
+    framesSinceFull = 0
+
+    if imgHSV is None or imgHSV.shape != img.shape:
+        imgHSV = np.empty_like(img)
+        mask = np.empty(img.shape[:2],np.uint8)
+        maskOpen = np.empty_like(mask)
+        maskClose = np.empty_like(mask)
 
     #convert BGR to HSV
-    imgHSV= cv2.cvtColor(img,cv2.COLOR_BGR2HSV)
+    cv2.cvtColor(img,cv2.COLOR_BGR2HSV,dst=imgHSV)
     # create the Mask
-    mask=cv2.inRange(imgHSV,lowerBound,upperBound)
+    cv2.inRange(imgHSV,lowerBound,upperBound,dst=mask)
     #morphology
-    maskOpen=cv2.morphologyEx(mask,cv2.MORPH_OPEN,kernelOpen)
-    maskClose=cv2.morphologyEx(maskOpen,cv2.MORPH_CLOSE,kernelClose)
+    cv2.morphologyEx(mask,cv2.MORPH_OPEN,kernelOpen,dst=maskOpen)
+    cv2.morphologyEx(maskOpen,cv2.MORPH_CLOSE,kernelClose,dst=maskClose)
 
     maskFinal=maskClose
-    conts,h=cv2.findContours(maskFinal.copy(),cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_NONE)
+    #findContours no longer modifies its input (OpenCV >= 3.2), no copy needed
+    conts,h=cv2.findContours(maskFinal,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_NONE)
+    nConts = len(conts)
+    idle = nConts == 0
     
-    if len(conts) == 2:
+    if nConts == 2:
         if pinchFlag == 1:
             pinchFlag = 0
             mouse.release(Button.left)
@@ -61,12 +132,7 @@ while True:
         cy = (cy1+cy2)//2
         cv2.line(img, (cx1,cy1), (cx2,cy2), (255,0,0), 2)
         cv2.circle(img, (cx,cy), 2, (0,0,255),2)
-        mouseLoc = mLocOld + ((cx,cy) - mLocOld)/DampingFactor
-        mouse.position = (sx-(mouseLoc[0]*sx//camx),mouseLoc[1]*sy//camy)
-        while mouse.position != (sx-(mouseLoc[0]*sx//camx),mouseLoc[1]*sy//camy):
-            pass
-        mlocOld = mouseLoc
-    elif len(conts) == 1:
+    elif nConts == 1:
         if pinchFlag == 0:
             pinchFlag = 1
             mouse.press(Button.left)
@@ -75,14 +141,21 @@ while True:
         cx = x + w//2
         cy = y + h//2
         cv2.circle(img, (cx,cy), (w+h)//4, (0,0,255),2)
+
+    #both gestures move the pointer the same way, so do it once here
+    if nConts == 1 or nConts == 2:
         mouseLoc = mLocOld + ((cx,cy) - mLocOld)/DampingFactor
-        mouse.position = (sx-(mouseLoc[0]*sx//camx),mouseLoc[1]*sy//camy)
-        while mouse.position != (sx-(mouseLoc[0]*sx//camx),mouseLoc[1]*sy//camy):
-            pass
+        #map camera -> screen once per frame
+        px,py = mouseLoc[0]*sx//camx,mouseLoc[1]*sy//camy
+        pos = (sx-px,py)
+        if lastPos is None or abs(pos[0]-lastPos[0]) >= Deadband or abs(pos[1]-lastPos[1]) >= Deadband:
+            mouse.position = pos
+            lastPos = pos
         mlocOld = mouseLoc
 
     #cv2.imshow("maskClose",maskClose)
     #cv2.imshow("maskOpen",maskOpen)
     #cv2.imshow("mask",mask)
     cv2.imshow("cam",img)
-    cv2.waitKey(5)
+    #cadence comes from the camera; waitKey only needs to pump GUI events
+    cv2.waitKey(1)